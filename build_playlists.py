@@ -1,7 +1,13 @@
 import os
+import collections
 import csv
 import dropbox
+import functools
+import io
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
 
 # Configure logging
 logging.basicConfig(
@@ -13,69 +19,154 @@ DROPBOX_ACCESS_TOKEN = "your_dropbox_token"
 DROPBOX_ROOT_FOLDER = "/dropbox/path/to/root"
 LOCAL_ROOT_FOLDER = "/local/path/to/root"
 
-# Initialize Dropbox client
-dbx = dropbox.Dropbox(DROPBOX_ACCESS_TOKEN)
+# Number of concurrent Dropbox requests
+MAX_WORKERS = 5
+
+# Number of folders whose link lookups may be queued ahead of the playlist
+# currently being written
+LOOKAHEAD_FOLDERS = 3
+
+_thread_local = threading.local()
+
+# Existing shared links keyed by lower-cased Dropbox path, filled by main()
+SHARED_LINKS = {}
+
+
+@functools.cache
+def get_session():
+    # One keep-alive connection pool shared by all worker clients, sized so
+    # every worker can hold a connection open.
+    return dropbox.create_session(max_connections=MAX_WORKERS)
+
+
+def get_dbx():
+    # Each worker thread gets its own lightweight client; they all share the
+    # pooled session from dropbox.create_session, which the SDK supports.
+    if not hasattr(_thread_local, "dbx"):
+        _thread_local.dbx = dropbox.Dropbox(DROPBOX_ACCESS_TOKEN, session=get_session())
+    return _thread_local.dbx
+
+
+def prefetch_shared_links():
+    shared_links = {}
+    result = get_dbx().sharing_list_shared_links()
+    while True:
+        for link in result.links:
+            if link.path_lower:
+                shared_links[link.path_lower] = link.url
+        if not result.has_more:
+            break
+        result = get_dbx().sharing_list_shared_links(cursor=result.cursor)
+    logging.info(f"Prefetched {len(shared_links)} existing shared links")
+    return shared_links
 
 
 def get_existing_shared_link(file_path):
-    links = dbx.sharing_list_shared_links(path=file_path).links
-    for link in links:
-        if link.path_lower == file_path.lower():
-            logging.info(f"Existing link found for {file_path}: {link.url}")
-            return link.url
-    return None
+    url = SHARED_LINKS.get(file_path.lower())
+    if url:
+        logging.info(f"Existing link found for {file_path}: {url}")
+    return url
 
 
+@functools.lru_cache(maxsize=None)
 def get_or_create_shared_link(file_path):
+    logging.info(f"Getting shared link for {file_path}")
     existing_link = get_existing_shared_link(file_path)
     if existing_link:
         return existing_link
 
-    shared_link = dbx.sharing_create_shared_link_with_settings(file_path)
+    shared_link = get_dbx().sharing_create_shared_link_with_settings(file_path)
     url = shared_link.url
     logging.info(f"Created new link for {file_path}: {url}")
     return url
 
 
-def create_playlist_for_folder(local_folder_path, dropbox_folder_path):
-    playlist = []
-    folder_name = os.path.basename(local_folder_path)
+def iter_mp3_filenames(folder_path):
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            if entry.name.endswith(".mp3") and entry.is_file():
+                yield entry.name
+
 
-    for filename in os.listdir(local_folder_path):
-        if filename.endswith(".mp3"):
-            name = os.path.splitext(filename)[0]
-            dropbox_file_path = os.path.join(dropbox_folder_path, filename).replace(
-                "\\", "/"
-            )
-
-            logging.info(f"Getting shared link for {dropbox_file_path}")
-            src = get_or_create_shared_link(dropbox_file_path)
-            if src:
-                playlist.append([name, src, folder_name])
-
-    if playlist:
-        csv_filename = f"{folder_name}_playlist.csv"
-        csv_filepath = os.path.join(local_folder_path, csv_filename)
-        with open(csv_filepath, "w", newline="", encoding="utf-8") as csvfile:
-            csvwriter = csv.writer(csvfile)
-            csvwriter.writerow(["name", "src", "tags"])
-            csvwriter.writerows(playlist)
-        logging.info(f"Playlist created: {csv_filepath}")
-    else:
-        logging.warning(
-            f"No mp3 files found in {local_folder_path} or failed to create shared links."
-        )
+def list_tracks(local_folder_path, dropbox_folder_path):
+    tracks = []
+    for filename in sorted(iter_mp3_filenames(local_folder_path)):
+        name = PurePosixPath(filename).stem
+        dropbox_file_path = str(dropbox_folder_path / filename)
+        tracks.append((name, dropbox_file_path))
+    return tracks
+
+
+def write_playlist(local_folder_path, tracks, srcs):
+    folder_name = os.path.basename(local_folder_path)
+    # Debugging: log the folder being processed
+    logging.info(f"Processing folder: {folder_name}")
+
+    if not tracks:
+        logging.warning(f"No mp3 files found in {local_folder_path}.")
+        return
+
+    csv_filename = f"{folder_name}_playlist.csv"
+    csv_filepath = os.path.join(local_folder_path, csv_filename)
+    buffer = io.StringIO(newline="")
+    csvwriter = csv.writer(buffer)
+    csvwriter.writerow(["name", "src", "tags"])
+    csvwriter.writerows(
+        [name, src, folder_name] for (name, _), src in zip(tracks, srcs) if src
+    )
+    content = buffer.getvalue().encode("utf-8")
+
+    # Leave an unchanged playlist untouched so Dropbox doesn't re-sync it
+    try:
+        with open(csv_filepath, "rb") as csvfile:
+            if csvfile.read() == content:
+                logging.info(f"Playlist unchanged: {csv_filepath}")
+                return
+    except FileNotFoundError:
+        pass
+
+    # Write to a sibling temp file and swap it in so a failed write never
+    # leaves a truncated playlist or a stray temp file behind.
+    tmp_filepath = csv_filepath + ".tmp"
+    try:
+        with open(tmp_filepath, "wb") as csvfile:
+            csvfile.write(content)
+        os.replace(tmp_filepath, csv_filepath)
+    except BaseException:
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+        raise
+    logging.info(f"Playlist created: {csv_filepath}")
 
 
 def main():
-    for folder_name in os.listdir(LOCAL_ROOT_FOLDER):
-        # Debugging: log the folder being processed
-        logging.info(f"Processing folder: {folder_name}")
-
-        local_folder_path = os.path.join(LOCAL_ROOT_FOLDER, folder_name)
-        dropbox_folder_path = os.path.join(DROPBOX_ROOT_FOLDER, folder_name)
-        if os.path.isdir(local_folder_path):
-            create_playlist_for_folder(local_folder_path, dropbox_folder_path)
+    SHARED_LINKS.update(prefetch_shared_links())
+    dropbox_root = PurePosixPath(DROPBOX_ROOT_FOLDER)
+
+    with os.scandir(LOCAL_ROOT_FOLDER) as entries:
+        folders = [entry for entry in entries if entry.is_dir()]
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        # Queue link lookups a few folders ahead so the workers keep resolving
+        # links while earlier playlists are being written.
+        pending = collections.deque()
+        try:
+            for entry in folders:
+                logging.info(f"Queueing link lookups for folder: {entry.name}")
+                tracks = list_tracks(entry.path, dropbox_root / entry.name)
+                srcs = executor.map(
+                    get_or_create_shared_link, [path for _, path in tracks]
+                )
+                pending.append((entry.path, tracks, srcs))
+                if len(pending) > LOOKAHEAD_FOLDERS:
+                    write_playlist(*pending.popleft())
+            while pending:
+                write_playlist(*pending.popleft())
+        except BaseException:
+            # Don't create links for queued folders once the run has failed
+            # or been interrupted.
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
 
 
 if __name__ == "__main__":